@@ -6,6 +6,7 @@ __all__ = [
     "extract",
     "transform",
     "load",
+    "write",
     "report",
     "scheduler",
     "main",
@@ -1,23 +1,46 @@
+import copy
+import functools
 import os
 import re
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import yaml
 
 _ENV_VAR_PATTERN = re.compile(r"\$\{([A-Z0-9_]+)\}")
 
 
-def _interpolate_env_vars(raw: str) -> str:
-    def replacer(match: re.Match[str]) -> str:
-        var = match.group(1)
-        return os.getenv(var, "")
+def _split_template(raw: str) -> Tuple[str, ...]:
+    # [literal, var, literal, var, ..., literal]
+    if "${" not in raw:
+        return (raw,)
+    return tuple(_ENV_VAR_PATTERN.split(raw))
 
-    return _ENV_VAR_PATTERN.sub(replacer, raw)
 
+def _render_template(parts: Tuple[str, ...]) -> str:
+    if len(parts) == 1:
+        return parts[0]
+    environ = os.environ
+    return "".join(
+        part if i % 2 == 0 else environ.get(part, "") for i, part in enumerate(parts)
+    )
 
-def load_config(path: str) -> Dict[str, Any]:
+
+@functools.lru_cache(maxsize=16)
+def _load_template(path: str, mtime_ns: int) -> Tuple[str, ...]:
     with open(path, "r", encoding="utf-8") as f:
-        raw = f.read()
-    text = _interpolate_env_vars(raw)
-    data = yaml.safe_load(text) or {}
-    return data
+        return _split_template(f.read())
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_yaml(text: str) -> Dict[str, Any]:
+    return yaml.safe_load(text) or {}
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    # The file is read and tokenised once per mtime; env vars are filled in
+    # on every call since they may change (e.g. after load_dotenv()).
+    parts = _load_template(path, os.stat(path).st_mtime_ns)
+    text = _render_template(parts)
+    # Parsed configs are cached on the interpolated text, so a scheduler
+    # re-reading an unchanged file (and unchanged env) skips the YAML parse.
+    return copy.deepcopy(_parse_yaml(text))
@@ -1,13 +1,19 @@
 import os
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import mysql.connector
+import orjson
 from mysql.connector import Error
 from tenacity import (
+    Retrying,
     retry,
     stop_after_attempt,
     wait_exponential,
+    retry_if_exception,
     retry_if_exception_type,
 )
 
@@ -15,6 +21,34 @@ from .logger import get_logger
 
 logger = get_logger("etl.extract")
 
+MIN_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 200000
+
+# The stream sits idle while batches ahead of it are loaded into BigQuery;
+# give MySQL that long before it drops the connection (default is 60s)
+STREAM_NET_TIMEOUT = 900
+STREAM_ATTEMPTS = 5
+# Rows sharing the last incremental value are remembered so a resumed
+# stream can skip them; past this many (e.g. after a bulk UPDATE) a lost
+# stream is not resumed and the error is raised instead
+MAX_RESUME_TIES = 100000
+
+
+def estimate_row_bytes(rows: List[Any]) -> int:
+    return max(1, len(orjson.dumps(rows, default=str)) // max(1, len(rows)))
+
+
+def adaptive_batch_size(row_bytes: int, target_bytes: int) -> int:
+    # Size batches by observed row width: narrow tables get big batches,
+    # wide ones stay well under BigQuery request and max_allowed_packet limits
+    return max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, target_bytes // row_bytes))
+
+
+@dataclass
+class Session:
+    conn: Any
+    cursor: Any
+
 
 class MySQLExtractor:
     def __init__(self, connection_params: Dict[str, Any]):
@@ -37,13 +71,26 @@ class MySQLExtractor:
                 rows = cur.fetchall()
         return [(row[0], str(row[1])) for row in rows]
 
-    @retry(
-        reraise=True,
-        wait=wait_exponential(multiplier=1, min=2, max=30),
-        stop=stop_after_attempt(5),
-        retry=retry_if_exception_type(Error),
-    )
-    def fetch_incremental(
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SET SESSION net_write_timeout = %s, net_read_timeout = %s",
+                    (STREAM_NET_TIMEOUT, STREAM_NET_TIMEOUT),
+                )
+            # Prepared statements use the binary protocol and are planned
+            # once; rows are left on the socket until fetched.
+            cur = conn.cursor(prepared=True)
+            try:
+                yield Session(conn=conn, cursor=cur)
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+
+    def iter_incremental(
         self,
         table: str,
         columns: List[str],
@@ -52,22 +99,138 @@ class MySQLExtractor:
         end_value: Optional[Any] = None,
         batch_size: int = 5000,
         operator: str = ">",
-    ) -> List[Dict[str, Any]]:
+        target_batch_bytes: Optional[int] = None,
+        on_row_bytes: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        # The first batch is measured once (estimate_row_bytes) when either
+        # target_batch_bytes or on_row_bytes asks for the row width
         if operator not in (">", ">="):
             raise ValueError("operator must be '>' or '>='")
         cols = ", ".join([f"`{c}`" for c in columns])
-        if end_value is None:
-            query = f"SELECT {cols} FROM `{table}` WHERE `{incremental_column}` {operator} %s ORDER BY `{incremental_column}` ASC LIMIT %s"
-            params = (start_value, batch_size)
+        lt_op = "<=" if operator == ">=" else "<"
+        inc_idx = columns.index(incremental_column)
+        # Rows already yielded at the last incremental value (None once there
+        # are more than MAX_RESUME_TIES); a resumed stream restarts at that
+        # value and skips exactly these
+        seen: Optional[Counter] = Counter()
+        seen_value: Any = None
+        seen_count = 0
+        skip: Counter = Counter()
+        stack = ExitStack()
+        cursor: Any = None
+        measure = bool(target_batch_bytes or on_row_bytes)
+
+        def query() -> Tuple[str, Tuple[Any, ...]]:
+            if end_value is None:
+                return (
+                    f"SELECT {cols} FROM `{table}` WHERE `{incremental_column}` {operator} %s ORDER BY `{incremental_column}` ASC",
+                    (start_value,),
+                )
+            return (
+                f"SELECT {cols} FROM `{table}` WHERE `{incremental_column}` {operator} %s AND `{incremental_column}` {lt_op} %s ORDER BY `{incremental_column}` ASC",
+                (start_value, end_value),
+            )
+
+        def log_retry(retry_state: Any) -> None:
+            logger.warning(
+                "Lost MySQL stream for %s (%s); resuming from %s",
+                table,
+                retry_state.outcome.exception(),
+                start_value,
+            )
+
+        def fetch() -> List[Tuple[Any, ...]]:
+            nonlocal cursor, skip
+            for attempt in Retrying(
+                reraise=True,
+                wait=wait_exponential(multiplier=1, min=2, max=30),
+                stop=stop_after_attempt(STREAM_ATTEMPTS),
+                retry=retry_if_exception(
+                    lambda exc: isinstance(exc, Error) and seen is not None
+                ),
+                before_sleep=log_retry,
+            ):
+                with attempt:
+                    try:
+                        if cursor is None:
+                            cursor = stack.enter_context(self.session()).cursor
+                            cursor.execute(*query())
+                            skip = Counter(seen)
+                        return cursor.fetchmany(batch_size)
+                    except Error:
+                        cursor = None
+                        stack.close()
+                        raise
+            return []
+
+        # One connection and one statement for the whole range; batches are
+        # pulled off the streamed result instead of re-querying per page.
+        # Rows are yielded as the cursor's tuples, in `columns` order.
+        try:
+            while True:
+                rows = fetch()
+                if not rows:
+                    return
+                if skip:
+                    rows = _drop_seen(rows, skip, inc_idx, start_value)
+                    if not rows:
+                        continue
+                if measure:
+                    measure = False
+                    row_bytes = estimate_row_bytes(rows)
+                    if target_batch_bytes:
+                        batch_size = adaptive_batch_size(row_bytes, target_batch_bytes)
+                        logger.debug("Batch size for %s set to %d", table, batch_size)
+                    if on_row_bytes is not None:
+                        on_row_bytes(row_bytes)
+                last = rows[-1][inc_idx]
+                k = len(rows)
+                while k and rows[k - 1][inc_idx] == last:
+                    k -= 1
+                if k or last != seen_value:
+                    seen, seen_value, seen_count = Counter(), last, 0
+                if seen is not None:
+                    seen_count += len(rows) - k
+                    if seen_count > MAX_RESUME_TIES:
+                        seen = None
+                    else:
+                        seen.update(_row_key(row) for row in rows[k:])
+                start_value, operator = last, ">="
+                yield rows
+        finally:
+            stack.close()
+
+
+def _row_key(row: Tuple[Any, ...]) -> Any:
+    # VECTOR columns come back as arrays, which can't be counted as-is
+    try:
+        hash(row)
+        return row
+    except TypeError:
+        return repr(row)
+
+
+def _drop_seen(
+    rows: List[Tuple[Any, ...]],
+    skip: Counter,
+    inc_idx: int,
+    resume_value: Any,
+) -> List[Tuple[Any, ...]]:
+    # Rows come back ordered by the incremental column, so only the leading
+    # run at the resume value can have been yielded before; ties may come
+    # back in another order, hence the match on whole rows
+    kept: List[Tuple[Any, ...]] = []
+    for i, row in enumerate(rows):
+        if row[inc_idx] != resume_value:
+            skip.clear()
+            kept.extend(rows[i:])
+            break
+        key = _row_key(row)
+        if skip[key]:
+            skip[key] -= 1
         else:
-            lt_op = "<=" if operator == ">=" else "<"
-            query = f"SELECT {cols} FROM `{table}` WHERE `{incremental_column}` {operator} %s AND `{incremental_column}` {lt_op} %s ORDER BY `{incremental_column}` ASC LIMIT %s"
-            params = (start_value, end_value, batch_size)
-        with self._connect() as conn:
-            with conn.cursor(dictionary=True) as cur:
-                cur.execute(query, params)
-                rows = cur.fetchall()
-        return rows
+            kept.append(row)
+    return kept
 
 
 def build_mysql_params() -> Dict[str, Any]:
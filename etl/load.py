@@ -1,19 +1,82 @@
+import io
 import os
-from typing import Any, Dict, List
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
 
+import orjson
+import pandas as pd
 from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
+from google.cloud.exceptions import Forbidden, NotFound
 
 from .logger import get_logger
+from .write import BigQueryWriter
 
 logger = get_logger("etl.load")
 
 
+WRITE_METHODS = ("load_job", "storage_write")
+UPSERT_STRATEGIES = ("merge", "delete_insert")
+
+# BigQuery accepts at most four clustering columns per table
+_MAX_CLUSTERING_FIELDS = 4
+
+# Batches arrive either as row dicts (NDJSON) or as a frame (Parquet)
+Rows = Union[List[Dict[str, Any]], pd.DataFrame]
+
+_NDJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _to_ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    return b"\n".join(
+        orjson.dumps(r, default=_json_default, option=_NDJSON_OPTIONS) for r in rows
+    )
+
+
+def _row_dicts(rows: Rows) -> List[Dict[str, Any]]:
+    if isinstance(rows, pd.DataFrame):
+        return rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+    return rows
+
+
+def _is_quota_exceeded(exc: Forbidden) -> bool:
+    return any(e.get("reason") == "quotaExceeded" for e in exc.errors or [])
+
+
+@dataclass(frozen=True)
+class UpsertTemplate:
+    strategy: str
+    sql: str
+
+
 class BigQueryLoader:
-    def __init__(self, project: str, dataset: str, location: str = "US"):
+    def __init__(
+        self,
+        project: str,
+        dataset: str,
+        location: str = "US",
+        write_method: str = "load_job",
+    ):
+        if write_method not in WRITE_METHODS:
+            raise ValueError(f"Unknown write method: {write_method}")
         self.client = bigquery.Client(project=project)
         self.dataset = dataset
         self.location = location
+        self.writer = (
+            BigQueryWriter(self.client, dataset)
+            if write_method == "storage_write"
+            else None
+        )
+        self._fallback_writer: Optional[BigQueryWriter] = None
+        self._table_cache: Dict[str, bigquery.Table] = {}
+        self._staging: Dict[str, Tuple[str, UpsertTemplate]] = {}
         self.ensure_dataset()
 
     def ensure_dataset(self) -> None:
@@ -23,78 +86,298 @@ class BigQueryLoader:
         except NotFound:
             ds = bigquery.Dataset(dataset_ref)
             ds.location = self.location
-            self.client.create_dataset(ds)
+            # Mapping threads each build a loader; on a first run they race here
+            self.client.create_dataset(ds, exists_ok=True)
 
-    def ensure_table(self, table: str) -> None:
+    def ensure_table(
+        self,
+        table: str,
+        schema: Optional[List[bigquery.SchemaField]] = None,
+        time_partitioning: Optional[bigquery.TimePartitioning] = None,
+    ) -> bigquery.Table:
+        cached = self._table_cache.get(table)
+        if cached is not None:
+            return cached
         ref = bigquery.TableReference(
             bigquery.DatasetReference(self.client.project, self.dataset), table
         )
         try:
-            self.client.get_table(ref)
+            table_obj = self.client.get_table(ref)
         except NotFound:
-            t = bigquery.Table(ref)
+            # A partitioned table must be created with its partition column,
+            # so callers asking for partitioning also pass the schema
+            t = bigquery.Table(ref, schema=schema)
             t.location = self.location
-            self.client.create_table(t)
+            t.time_partitioning = time_partitioning
+            table_obj = self.client.create_table(t)
+        self._table_cache[table] = table_obj
+        return table_obj
 
-    def load_append(self, table: str, rows: List[Dict[str, Any]]) -> int:
-        if not rows:
+    def cache_table(self, table_obj: bigquery.Table) -> None:
+        # Callers that change a table (e.g. add_missing_columns) hand back
+        # the updated object so later loads see the new schema
+        self._table_cache[table_obj.table_id] = table_obj
+
+    def _cached_schema(self, table: str) -> Optional[List[bigquery.SchemaField]]:
+        table_obj = self._table_cache.get(table)
+        return list(table_obj.schema) if table_obj is not None else None
+
+    def load_append(self, table: str, rows: Rows) -> int:
+        if len(rows) == 0:
             return 0
-        ref = f"{self.client.project}.{self.dataset}.{table}"
-        job_config = bigquery.LoadJobConfig()
-        job = self.client.load_table_from_json(rows, ref, job_config=job_config)
-        result = job.result()
-        return result.output_rows or len(rows)
+        if self.writer is not None:
+            return self.writer.append_default(
+                table, _row_dicts(rows), schema=self._cached_schema(table)
+            )
+        return self._load(table, rows, bigquery.LoadJobConfig(), pending=False)
 
-    def load_upsert(
-        self, table: str, rows: List[Dict[str, Any]], primary_keys: List[str]
+    def _start_load(
+        self, table: str, rows: Rows, job_config: bigquery.LoadJobConfig
+    ) -> bigquery.LoadJob:
+        destination = self._table_ref(table)
+        schema = self._cached_schema(table)
+        if isinstance(rows, pd.DataFrame):
+            # Columnar Parquet upload via pyarrow, no per-row encoding
+            job_config.source_format = bigquery.SourceFormat.PARQUET
+            if schema is not None:
+                # Saves load_table_from_dataframe its own get_table call
+                job_config.schema = [f for f in schema if f.name in rows.columns]
+            return self.client.load_table_from_dataframe(
+                rows, destination, job_config=job_config
+            )
+        # Encode NDJSON with orjson rather than letting load_table_from_json
+        # run stdlib json; the target table already exists (ensure_table), so
+        # no autodetect and no extra get_table round trip.
+        buf = _to_ndjson(rows)
+        job_config.source_format = bigquery.SourceFormat.NEWLINE_DELIMITED_JSON
+        job_config.autodetect = False
+        if schema is not None:
+            job_config.schema = schema
+        return self.client.load_table_from_file(
+            io.BytesIO(buf), destination, size=len(buf), job_config=job_config
+        )
+
+    def _load(
+        self,
+        table: str,
+        rows: Rows,
+        job_config: bigquery.LoadJobConfig,
+        pending: bool,
     ) -> int:
-        if not rows:
-            return 0
-        self.ensure_table(table)
-        # Create temp table
-        temp_table_name = f"_{table}_staging_{os.getpid()}"
-        temp_ref = bigquery.TableReference(
-            bigquery.DatasetReference(self.client.project, self.dataset),
-            temp_table_name,
+        try:
+            job = self._start_load(table, rows, job_config)
+            result = job.result()
+        except Forbidden as exc:
+            if not _is_quota_exceeded(exc):
+                raise
+            logger.warning(
+                "Load job quota exhausted for %s; using the Storage Write API", table
+            )
+            if self._fallback_writer is None:
+                self._fallback_writer = BigQueryWriter(self.client, self.dataset)
+            append = (
+                self._fallback_writer.append_pending
+                if pending
+                else self._fallback_writer.append_default
+            )
+            return append(table, _row_dicts(rows), schema=self._cached_schema(table))
+        return result.output_rows or len(rows)
+
+    def _table_ref(self, table: str) -> bigquery.TableReference:
+        return bigquery.TableReference(
+            bigquery.DatasetReference(self.client.project, self.dataset), table
         )
-        self.client.delete_table(temp_ref, not_found_ok=True)
-        temp_table = bigquery.Table(temp_ref)
-        self.client.create_table(temp_table)
 
-        # Load into temp
-        job_config = bigquery.LoadJobConfig(
-            autodetect=True, write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+    def _create_staging(self, table: str, primary_keys: List[str]) -> str:
+        staging_name = f"_{table}_staging_{os.getpid()}_{uuid4().hex[:8]}"
+        # Mirror the target schema so every batch appends into the same shape,
+        # and cluster on the keys the MERGE joins and partitions by
+        target_table = self.ensure_table(table)
+        staging_table = bigquery.Table(
+            self._table_ref(staging_name), schema=target_table.schema
         )
-        job = self.client.load_table_from_json(rows, temp_ref, job_config=job_config)
-        job.result()
+        staging_table.clustering_fields = primary_keys[:_MAX_CLUSTERING_FIELDS]
+        self._table_cache[staging_name] = self.client.create_table(staging_table)
+        return staging_name
 
-        # Build MERGE
+    def _upsert_template(
+        self,
+        table: str,
+        staging_name: str,
+        primary_keys: List[str],
+        columns: List[str],
+        order_by: Optional[str],
+        strategy: str,
+        partition_field: Optional[str],
+        partition_type: Optional[str],
+    ) -> UpsertTemplate:
+        # Built once per staging table, when its first batch is staged
         target = f"`{self.client.project}.{self.dataset}.{table}`"
-        staging = f"`{self.client.project}.{self.dataset}.{temp_table_name}`"
+        staging = f"`{self.client.project}.{self.dataset}.{staging_name}`"
+        partition_by = ", ".join(primary_keys)
+        order_clause = f" ORDER BY {order_by} DESC" if order_by else ""
         on_clause = " AND ".join([f"T.{k} = S.{k}" for k in primary_keys])
-        all_cols = list(rows[0].keys())
-        non_keys = [c for c in all_cols if c not in primary_keys]
+        # Batches are staged over the whole run, so a key may appear more
+        # than once; keep only its latest version as the upsert source. The
+        # staging table mirrors the target's schema, so INSERT ROW lines up.
+        source = f"""(
+				SELECT * EXCEPT(_row_num) FROM (
+					SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition_by}{order_clause}) AS _row_num
+					FROM {staging}
+				) WHERE _row_num = 1
+			)"""
+        if strategy == "delete_insert":
+            sql = self._delete_insert_sql(
+                target,
+                staging,
+                source,
+                on_clause,
+                partition_field,
+                partition_type,
+            )
+        else:
+            sql = self._merge_sql(target, source, on_clause, primary_keys, columns)
+        return UpsertTemplate(strategy=strategy, sql=sql)
+
+    def _merge_sql(
+        self,
+        target: str,
+        source: str,
+        on_clause: str,
+        primary_keys: List[str],
+        columns: List[str],
+    ) -> str:
+        non_keys = [c for c in columns if c not in primary_keys]
+        # BigQuery has no tuple form of UPDATE SET, so columns are listed
         update_clause = ", ".join([f"{c} = S.{c}" for c in non_keys])
-        insert_cols = ", ".join(all_cols)
-        insert_vals = ", ".join([f"S.{c}" for c in all_cols])
         if non_keys:
-            merge_sql = f"""
+            return f"""
 			MERGE {target} T
-			USING {staging} S
+			USING {source} S
 			ON {on_clause}
 			WHEN MATCHED THEN UPDATE SET {update_clause}
-			WHEN NOT MATCHED THEN INSERT ({insert_cols}) VALUES ({insert_vals})
+			WHEN NOT MATCHED THEN INSERT ROW
 			"""
-        else:
-            merge_sql = f"""
+        return f"""
 			MERGE {target} T
-			USING {staging} S
+			USING {source} S
 			ON {on_clause}
-			WHEN NOT MATCHED THEN INSERT ({insert_cols}) VALUES ({insert_vals})
+			WHEN NOT MATCHED THEN INSERT ROW
 			"""
-        query_job = self.client.query(merge_sql)
-        query_job.result()
 
-        # Cleanup
-        self.client.delete_table(temp_ref, not_found_ok=True)
+    def _partition_field_type(self, table: str, partition_field: Optional[str]) -> str:
+        if not partition_field:
+            raise ValueError(f"delete_insert upsert into {table} needs partition_field")
+        field_type = next(
+            (
+                f.field_type
+                for f in self.ensure_table(table).schema
+                if f.name == partition_field
+            ),
+            None,
+        )
+        if field_type not in ("TIMESTAMP", "DATE"):
+            raise ValueError(
+                f"partition_field {partition_field} of {table} must be a TIMESTAMP "
+                f"or DATE column, got {field_type}"
+            )
+        return field_type
+
+    def _delete_insert_sql(
+        self,
+        target: str,
+        staging: str,
+        source: str,
+        on_clause: str,
+        partition_field: str,
+        field_type: str,
+    ) -> str:
+        # The staged rows' partition range bounds the DELETE, so BigQuery only
+        # scans those partitions instead of the whole target as MERGE does.
+        # NULLs never match BETWEEN (and all-NULL staging leaves lo/hi NULL),
+        # so the NULL partition is always part of the DELETE as well.
+        return f"""
+			DECLARE lo {field_type};
+			DECLARE hi {field_type};
+			SET (lo, hi) = (
+				SELECT AS STRUCT MIN({partition_field}), MAX({partition_field})
+				FROM {staging}
+			);
+			BEGIN TRANSACTION;
+			DELETE FROM {target} T
+			WHERE (
+					T.{partition_field} BETWEEN lo AND hi
+					OR T.{partition_field} IS NULL
+				)
+				AND EXISTS (SELECT 1 FROM {staging} S WHERE {on_clause});
+			INSERT INTO {target}
+			SELECT * FROM {source};
+			COMMIT TRANSACTION;
+			"""
+
+    def load_upsert(
+        self,
+        table: str,
+        rows: Rows,
+        primary_keys: List[str],
+        order_by: Optional[str] = None,
+        strategy: str = "merge",
+        partition_field: Optional[str] = None,
+    ) -> int:
+        # Rows are only staged here; commit_upserts() applies them once
+        if strategy not in UPSERT_STRATEGIES:
+            raise ValueError(f"Unknown upsert strategy: {strategy}")
+        if len(rows) == 0:
+            return 0
+        staged = self._staging.get(table)
+        if staged is None:
+            partition_type = None
+            if strategy == "delete_insert":
+                # Fail before a staging table exists to be cleaned up
+                partition_type = self._partition_field_type(table, partition_field)
+            staging_name = self._create_staging(table, primary_keys)
+            columns = (
+                list(rows.columns)
+                if isinstance(rows, pd.DataFrame)
+                else list(rows[0].keys())
+            )
+            template = self._upsert_template(
+                table,
+                staging_name,
+                primary_keys,
+                columns,
+                order_by,
+                strategy,
+                partition_field,
+                partition_type,
+            )
+            staged = (staging_name, template)
+            self._staging[table] = staged
+        staging_name, _ = staged
+
+        if self.writer is not None:
+            self.writer.append_pending(
+                staging_name, _row_dicts(rows), schema=self._cached_schema(staging_name)
+            )
+        else:
+            job_config = bigquery.LoadJobConfig(
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            )
+            self._load(staging_name, rows, job_config, pending=True)
         return len(rows)
+
+    def commit_upserts(self) -> None:
+        try:
+            for table, (_, template) in self._staging.items():
+                logger.debug(
+                    "Applying staged rows to %s (%s)", table, template.strategy
+                )
+                self.client.query(template.sql).result()
+        finally:
+            self.discard_upserts()
+
+    def discard_upserts(self) -> None:
+        for staging_name, _ in self._staging.values():
+            self.client.delete_table(self._table_ref(staging_name), not_found_ok=True)
+            self._table_cache.pop(staging_name, None)
+        self._staging.clear()
@@ -1,8 +1,11 @@
 import argparse
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from google.cloud import bigquery
@@ -10,15 +13,23 @@ from google.cloud import bigquery
 from .config_loader import load_config
 from .logger import get_logger, with_context
 from .state import StateConfig, StateStore
-from .schema import get_bq_table_schema, schema_difference, add_missing_columns
+from .schema import (
+    schema_difference,
+    add_missing_columns,
+    bq_schema_for,
+    normalize_mysql_type,
+    timestamp_columns,
+)
 from .extract import MySQLExtractor, build_mysql_params
-from .transform import cast_nulls, normalize_timestamps, align_columns
+from .transform import transform_batch, transform_frame
 from .load import BigQueryLoader
 from .report import RunReport, write_daily_report
 from .scheduler import schedule_daily
 
 logger = get_logger("etl.main")
 
+DEFAULT_TARGET_BATCH_BYTES = 64 * 1024 * 1024
+
 
 def _build_state_store(cfg: Dict[str, Any]) -> StateStore:
     state_cfg = StateConfig(
@@ -30,6 +41,205 @@ def _build_state_store(cfg: Dict[str, Any]) -> StateStore:
     return StateStore(state_cfg)
 
 
+def _batch_sizing(
+    mapping: Dict[str, Any], global_cfg: Dict[str, Any], default_batch_size: int
+) -> Dict[str, Any]:
+    # A mapping-level batch_size pins the fetch size; otherwise the first
+    # batch is measured and the rest are sized to target_batch_bytes.
+    if "batch_size" in mapping:
+        return {"batch_size": mapping["batch_size"], "target_batch_bytes": None}
+    return {
+        "batch_size": default_batch_size,
+        "target_batch_bytes": global_cfg.get(
+            "target_batch_bytes", DEFAULT_TARGET_BATCH_BYTES
+        ),
+    }
+
+
+def _load_buffering(global_cfg: Dict[str, Any]) -> Dict[str, Any]:
+    # Rows are pooled only for load jobs, which BigQuery caps per table per
+    # day; the Storage Write API takes each batch as it comes. The pool is
+    # bounded by target_batch_bytes as well, so wide rows don't pile up.
+    if global_cfg.get("write_method", "load_job") == "storage_write":
+        return {"min_load_rows": 0, "max_load_bytes": None}
+    return {
+        "min_load_rows": global_cfg.get("min_load_rows", 100000),
+        "max_load_bytes": global_cfg.get(
+            "target_batch_bytes", DEFAULT_TARGET_BATCH_BYTES
+        ),
+    }
+
+
+def _prefetch(
+    items: Generator[Any, None, None], maxsize: int = 2
+) -> Iterator[Any]:
+    # Drive `items` on a background thread through a bounded queue so the
+    # producer (MySQL fetch + transform) overlaps with the consumer (load).
+    q: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry: Tuple[str, Any]) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except BaseException as exc:
+            put(("error", exc))
+        finally:
+            items.close()
+
+    thread = threading.Thread(target=produce, name="etl-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, payload = q.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _ensure_target(
+    bq_loader: BigQueryLoader,
+    mapping: Dict[str, Any],
+    mysql_columns: List[Tuple[str, str]],
+) -> bigquery.Table:
+    table = mapping["bigquery_table"]
+    if (
+        mapping.get("mode", "append") != "upsert"
+        or mapping.get("upsert_strategy", "merge") != "delete_insert"
+    ):
+        return bq_loader.ensure_table(table)
+    # delete_insert prunes the DELETE by partition, so a new target is
+    # created day-partitioned on partition_field
+    field = mapping.get("partition_field")
+    mysql_type = dict(mysql_columns).get(field)
+    bq_type = normalize_mysql_type(mysql_type) if mysql_type else None
+    if bq_type not in ("TIMESTAMP", "DATE"):
+        raise ValueError(
+            f"Mapping {mapping['name']}: partition_field must name a "
+            "DATETIME, TIMESTAMP or DATE column"
+        )
+    tbl = bq_loader.ensure_table(
+        table,
+        schema=bq_schema_for(mysql_columns),
+        time_partitioning=bigquery.TimePartitioning(field=field),
+    )
+    if tbl.time_partitioning is None or tbl.time_partitioning.field != field:
+        logger.warning(
+            "%s is not partitioned on %s; its DELETEs will scan the whole table",
+            table,
+            field,
+        )
+    return tbl
+
+
+def _sync_batches(
+    extractor: MySQLExtractor,
+    bq_loader: BigQueryLoader,
+    mapping: Dict[str, Any],
+    mysql_columns: List[Tuple[str, str]],
+    tz: str,
+    start_value: Any,
+    end_value: Optional[Any] = None,
+    batch_size: int = 10000,
+    inclusive_start: bool = False,
+    load_format: str = "json",
+    min_load_rows: int = 0,
+    max_load_bytes: Optional[int] = None,
+    target_batch_bytes: Optional[int] = None,
+    on_loaded: Optional[Callable[[Any], None]] = None,
+) -> Tuple[int, Any]:
+    # on_loaded(max_val) fires once rows up to max_val are durably in
+    # BigQuery: after every append, and after the MERGE for upserts
+    if load_format == "parquet":
+        transform = transform_frame
+    elif load_format == "json":
+        transform = transform_batch
+    else:
+        raise ValueError(f"Unknown load format: {load_format}")
+    mode = mapping.get("mode", "append")
+    incremental_column = mapping["incremental_column"]
+    columns = [c for c, _ in mysql_columns]
+    ts_columns = timestamp_columns(mysql_columns)
+    # Batches arrive as value tuples in `columns` order
+    inc_idx = columns.index(incremental_column)
+
+    def transformed_batches() -> Generator[Tuple[Any, Any], None, None]:
+        # Fetched rows are held until min_load_rows (or max_load_bytes,
+        # sized from the row width the extractor measured on the first
+        # batch) so each load job carries a large batch (BigQuery caps load
+        # jobs per table per day)
+        pending: List[Tuple[Any, ...]] = []
+        load_rows = min_load_rows
+
+        def cap_load_rows(row_bytes: int) -> None:
+            nonlocal load_rows
+            load_rows = min(min_load_rows, max_load_bytes // row_bytes)
+
+        for batch in extractor.iter_incremental(
+            mapping["mysql_table"],
+            columns,
+            incremental_column,
+            start_value=start_value,
+            end_value=end_value,
+            batch_size=batch_size,
+            operator=">=" if inclusive_start else ">",
+            target_batch_bytes=target_batch_bytes,
+            on_row_bytes=cap_load_rows if max_load_bytes else None,
+        ):
+            pending.extend(batch)
+            if len(pending) >= load_rows:
+                yield batch[-1][inc_idx], transform(
+                    pending, columns, tz=tz, timestamp_columns=ts_columns
+                )
+                pending = []
+        if pending:
+            yield pending[-1][inc_idx], transform(
+                pending, columns, tz=tz, timestamp_columns=ts_columns
+            )
+
+    loaded = 0
+    max_val = None
+    try:
+        # Fetch + transform run one batch ahead of the load
+        for max_val, records in _prefetch(transformed_batches()):
+            if mode == "append":
+                loaded += bq_loader.load_append(mapping["bigquery_table"], records)
+                if on_loaded is not None:
+                    on_loaded(max_val)
+            else:
+                loaded += bq_loader.load_upsert(
+                    mapping["bigquery_table"],
+                    records,
+                    primary_keys=mapping["primary_keys"],
+                    order_by=incremental_column,
+                    strategy=mapping.get("upsert_strategy", "merge"),
+                    partition_field=mapping.get("partition_field"),
+                )
+        bq_loader.commit_upserts()
+        if on_loaded is not None and mode != "append" and max_val is not None:
+            on_loaded(max_val)
+    except Exception:
+        bq_loader.discard_upserts()
+        raise
+    return loaded, max_val
+
+
 def _run_mapping(
     mapping: Dict[str, Any], global_cfg: Dict[str, Any], state: StateStore
 ) -> RunReport:
@@ -45,70 +255,49 @@ def _run_mapping(
         project=global_cfg["project"],
         dataset=global_cfg["dataset"],
         location=global_cfg.get("location", "US"),
+        write_method=global_cfg.get("write_method", "load_job"),
     )
 
     # Schema discovery
     mysql_columns = extractor.fetch_columns(mapping["mysql_table"])  # [(name, type)]
-    bq_loader.ensure_table(mapping["bigquery_table"])
-    bq_schema = get_bq_table_schema(
-        bq_loader.client, global_cfg["dataset"], mapping["bigquery_table"]
-    )
+    tbl = _ensure_target(bq_loader, mapping, mysql_columns)
+    bq_schema = list(tbl.schema)
     diff = schema_difference(mysql_columns, bq_schema)
     if diff["missing"] and global_cfg.get("allow_schema_additions", False):
-        add_missing_columns(
+        tbl = add_missing_columns(
             bq_loader.client,
             global_cfg["dataset"],
             mapping["bigquery_table"],
             diff["missing"],
+            table_obj=tbl,
         )
+        bq_loader.cache_table(tbl)
     elif diff["missing"]:
         context_logger.warning("Missing columns in BigQuery: %s", diff["missing"])
 
     # Incremental window
-    incremental_column = mapping["incremental_column"]
     last_sync = state.get_last_sync(name) or mapping.get("backfill_start")
     if not last_sync:
         last_sync = "1970-01-01T00:00:00Z"
 
-    # Fetch batches with pagination
-    columns = [c for c, _ in mysql_columns]
-    all_records: List[Dict[str, Any]] = []
-    next_start = last_sync
-    while True:
-        batch = extractor.fetch_incremental(
-            mapping["mysql_table"],
-            columns,
-            incremental_column,
-            start_value=next_start,
-            end_value=None,
-            batch_size=10000,
-            operator=">=" if not all_records else ">",
-        )
-        if not batch:
-            break
-        all_records.extend(batch)
-        next_start = batch[-1][incremental_column]
-
-    # Transform
-    records = cast_nulls(all_records)
-    records = normalize_timestamps(
-        records, tz=global_cfg.get("default_timezone", "UTC")
+    # Fetch, transform and load batch by batch so memory stays bounded; the
+    # watermark follows each successful load, so a failure part way through
+    # does not re-append what already landed
+    loaded, _ = _sync_batches(
+        extractor,
+        bq_loader,
+        mapping,
+        mysql_columns,
+        tz=global_cfg.get("default_timezone", "UTC"),
+        start_value=last_sync,
+        inclusive_start=True,
+        load_format=global_cfg.get("load_format", "json"),
+        **_load_buffering(global_cfg),
+        on_loaded=lambda max_val: state.set_last_sync(name, str(max_val)),
+        **_batch_sizing(mapping, global_cfg, default_batch_size=10000),
     )
-    records = align_columns(records, columns)
-
-    # Load
-    if mode == "append":
-        loaded = bq_loader.load_append(mapping["bigquery_table"], records)
-    else:
-        loaded = bq_loader.load_upsert(
-            mapping["bigquery_table"], records, primary_keys=mapping["primary_keys"]
-        )
 
     report.records_processed = loaded
-    # advance watermark
-    if all_records:
-        max_val = all_records[-1][incremental_column]
-        state.set_last_sync(name, str(max_val))
     report.duration_seconds = time.time() - start_time
     return report
 
@@ -117,12 +306,28 @@ def run_once(config_path: str) -> List[RunReport]:
     load_dotenv()
     cfg = load_config(config_path)
     state = _build_state_store(cfg)
-    reports: List[RunReport] = []
-    for mapping in cfg.get("mappings", []):
-        try:
-            reports.append(_run_mapping(mapping, cfg, state))
-        except Exception as exc:
-            logger.exception("Failed mapping %s: %s", mapping.get("name"), exc)
+    mappings = cfg.get("mappings", [])
+    # Mappings are IO-bound (MySQL reads, BigQuery jobs), so run them
+    # side by side; reports keep the config order.
+    results: Dict[int, RunReport] = {}
+    with ThreadPoolExecutor(
+        max_workers=max(1, cfg.get("max_parallel_mappings", 4))
+    ) as ex:
+        futures = {
+            ex.submit(_run_mapping, mapping, cfg, state): i
+            for i, mapping in enumerate(mappings)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as exc:
+                logger.exception("Failed mapping %s: %s", mappings[i].get("name"), exc)
+    reports: List[RunReport] = [results[i] for i in sorted(results)]
+    try:
+        state.flush()
+    except Exception as exc:
+        logger.exception("Failed to save sync state: %s", exc)
     try:
         path = write_daily_report(reports)
         logger.info("Wrote run report to %s", path)
@@ -149,31 +354,24 @@ def backfill(
         project=cfg["project"],
         dataset=cfg["dataset"],
         location=cfg.get("location", "US"),
+        write_method=cfg.get("write_method", "load_job"),
     )
 
     mysql_columns = extractor.fetch_columns(mapping["mysql_table"])
-    bq_loader.ensure_table(mapping["bigquery_table"])
-    columns = [c for c, _ in mysql_columns]
-
-    records = extractor.fetch_incremental(
-        mapping["mysql_table"],
-        columns,
-        mapping["incremental_column"],
+    _ensure_target(bq_loader, mapping, mysql_columns)
+    mode = mapping.get("mode", "append")
+    loaded, _ = _sync_batches(
+        extractor,
+        bq_loader,
+        mapping,
+        mysql_columns,
+        tz=cfg.get("default_timezone", "UTC"),
         start_value=start,
         end_value=end,
-        batch_size=100000,
+        load_format=cfg.get("load_format", "json"),
+        **_load_buffering(cfg),
+        **_batch_sizing(mapping, cfg, default_batch_size=100000),
     )
-    records = cast_nulls(records)
-    records = normalize_timestamps(records, tz=cfg.get("default_timezone", "UTC"))
-    records = align_columns(records, columns)
-
-    mode = mapping.get("mode", "append")
-    if mode == "append":
-        loaded = bq_loader.load_append(mapping["bigquery_table"], records)
-    else:
-        loaded = bq_loader.load_upsert(
-            mapping["bigquery_table"], records, primary_keys=mapping["primary_keys"]
-        )
 
     rep = RunReport(mapping_name=mapping_name, mode=mode, records_processed=loaded)
     return rep
@@ -1,8 +1,9 @@
 from dataclasses import dataclass, field
 from typing import Dict, List
-import json
 import os
 
+import orjson
+
 
 @dataclass
 class RunReport:
@@ -26,6 +27,6 @@ def write_daily_report(reports: List[RunReport], directory: str = "etl/reports")
     os.makedirs(directory, exist_ok=True)
     path = os.path.join(directory, "report.json")
     data = [r.to_dict() for r in reports]
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, sort_keys=True)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
     return path
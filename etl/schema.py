@@ -1,39 +1,71 @@
-from typing import Dict, List, Tuple
+import functools
+import re
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
 from google.cloud import bigquery
 
 
-MYSQL_TO_BQ_TYPE = {
-    "int": "INT64",
-    "bigint": "INT64",
-    "smallint": "INT64",
-    "tinyint": "INT64",
-    "float": "FLOAT64",
-    "double": "FLOAT64",
-    "decimal": "NUMERIC",
-    "varchar": "STRING",
-    "char": "STRING",
-    "text": "STRING",
-    "longtext": "STRING",
-    "datetime": "TIMESTAMP",
-    "timestamp": "TIMESTAMP",
-    "date": "DATE",
-    "time": "TIME",
-    "json": "STRING",
-}
+_TYPE_RE = re.compile(r"^\s*([a-zA-Z_]+)")
 
+MYSQL_TO_BQ_TYPE = MappingProxyType(
+    {
+        "int": "INT64",
+        "bigint": "INT64",
+        "smallint": "INT64",
+        "tinyint": "INT64",
+        "float": "FLOAT64",
+        "double": "FLOAT64",
+        "decimal": "NUMERIC",
+        "varchar": "STRING",
+        "char": "STRING",
+        "text": "STRING",
+        "longtext": "STRING",
+        "datetime": "TIMESTAMP",
+        "timestamp": "TIMESTAMP",
+        "date": "DATE",
+        "time": "TIME",
+        "json": "STRING",
+    }
+)
 
+
+@functools.lru_cache(maxsize=256)
 def normalize_mysql_type(mysql_type: str) -> str:
-    base = mysql_type.lower().split("(")[0].strip()
-    return MYSQL_TO_BQ_TYPE.get(base, "STRING")
+    # base type name only: "int(11) unsigned" / "int unsigned" -> "int"
+    match = _TYPE_RE.match(mysql_type)
+    if match is None:
+        return "STRING"
+    return MYSQL_TO_BQ_TYPE.get(match.group(1).lower(), "STRING")
+
+
+def timestamp_columns(mysql_columns: List[Tuple[str, str]]) -> List[str]:
+    return [
+        name
+        for name, mysql_type in mysql_columns
+        if normalize_mysql_type(mysql_type) == "TIMESTAMP"
+    ]
+
+
+def bq_schema_for(mysql_columns: List[Tuple[str, str]]) -> List[bigquery.SchemaField]:
+    return [
+        bigquery.SchemaField(
+            name=name, field_type=normalize_mysql_type(mysql_type), mode="NULLABLE"
+        )
+        for name, mysql_type in mysql_columns
+    ]
 
 
 def get_bq_table_schema(
-    client: bigquery.Client, dataset: str, table: str
+    client: bigquery.Client,
+    dataset: str,
+    table: str,
+    table_obj: Optional[bigquery.Table] = None,
 ) -> List[bigquery.SchemaField]:
-    ref = bigquery.TableReference(
-        bigquery.DatasetReference(client.project, dataset), table
-    )
-    table_obj = client.get_table(ref)
+    if table_obj is None:
+        ref = bigquery.TableReference(
+            bigquery.DatasetReference(client.project, dataset), table
+        )
+        table_obj = client.get_table(ref)
     return list(table_obj.schema)
 
 
@@ -56,18 +88,23 @@ def schema_difference(
 
 
 def add_missing_columns(
-    client: bigquery.Client, dataset: str, table: str, columns: List[Tuple[str, str]]
-) -> None:
+    client: bigquery.Client,
+    dataset: str,
+    table: str,
+    columns: List[Tuple[str, str]],
+    table_obj: Optional[bigquery.Table] = None,
+) -> Optional[bigquery.Table]:
     if not columns:
-        return
-    ref = bigquery.TableReference(
-        bigquery.DatasetReference(client.project, dataset), table
-    )
-    table_obj = client.get_table(ref)
+        return table_obj
+    if table_obj is None:
+        ref = bigquery.TableReference(
+            bigquery.DatasetReference(client.project, dataset), table
+        )
+        table_obj = client.get_table(ref)
     new_schema = list(table_obj.schema)
     for name, field_type in columns:
         new_schema.append(
             bigquery.SchemaField(name=name, field_type=field_type, mode="NULLABLE")
         )
     table_obj.schema = new_schema
-    client.update_table(table_obj, ["schema"])
+    return client.update_table(table_obj, ["schema"])
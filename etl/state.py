@@ -1,9 +1,10 @@
-import json
 import os
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, Optional
 
+import orjson
 from google.cloud import storage
 
 
@@ -18,17 +19,22 @@ class StateConfig:
 class StateStore:
     def __init__(self, cfg: StateConfig):
         self.cfg = cfg
+        # Watermarks are read once and written back by flush(); the lock
+        # guards the shared cache across mapping threads.
+        self._lock = threading.Lock()
+        self._cache = self.load()
+        self._dirty = False
 
     def _load_local(self) -> Dict[str, Any]:
         if not os.path.exists(self.cfg.local_path):
             return {}
-        with open(self.cfg.local_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(self.cfg.local_path, "rb") as f:
+            return orjson.loads(f.read())
 
     def _save_local(self, data: Dict[str, Any]) -> None:
         os.makedirs(os.path.dirname(self.cfg.local_path), exist_ok=True)
-        with open(self.cfg.local_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, sort_keys=True)
+        with open(self.cfg.local_path, "wb") as f:
+            f.write(orjson.dumps(data))
 
     def _gcs_blob(self):
         if not self.cfg.gcs_bucket or not self.cfg.gcs_prefix:
@@ -42,14 +48,13 @@ class StateStore:
         blob = self._gcs_blob()
         if not blob.exists():
             return {}
-        content = blob.download_as_text(encoding="utf-8")
-        return json.loads(content)
+        return orjson.loads(blob.download_as_bytes())
 
     def _save_gcs(self, data: Dict[str, Any]) -> None:
         blob = self._gcs_blob()
-        blob.upload_from_string(
-            json.dumps(data, indent=2, sort_keys=True), content_type="application/json"
-        )
+        # The state file is only read back by the syncer, so it is written
+        # compact and unsorted
+        blob.upload_from_string(orjson.dumps(data), content_type="application/json")
 
     def load(self) -> Dict[str, Any]:
         if self.cfg.store == "local":
@@ -67,12 +72,19 @@ class StateStore:
             raise ValueError(f"Unknown state store: {self.cfg.store}")
 
     def get_last_sync(self, mapping_name: str) -> Optional[str]:
-        data = self.load()
-        return data.get("last_sync", {}).get(mapping_name)
+        with self._lock:
+            return self._cache.get("last_sync", {}).get(mapping_name)
 
     def set_last_sync(self, mapping_name: str, iso_timestamp: str) -> None:
-        data = self.load()
-        if "last_sync" not in data:
-            data["last_sync"] = {}
-        data["last_sync"][mapping_name] = iso_timestamp
-        self.save(data)
+        with self._lock:
+            if "last_sync" not in self._cache:
+                self._cache["last_sync"] = {}
+            self._cache["last_sync"][mapping_name] = iso_timestamp
+            self._dirty = True
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.save(self._cache)
+            self._dirty = False
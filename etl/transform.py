@@ -1,41 +1,154 @@
-from datetime import datetime
-from typing import Any, Dict, Iterable, List
+import functools
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from zoneinfo import ZoneInfo
 
+import numpy as np
 import pandas as pd
-import pytz
 
 
-def normalize_timestamps(
-    records: Iterable[Dict[str, Any]], tz: str
-) -> List[Dict[str, Any]]:
-    if not records:
-        return []
-    tzinfo = pytz.timezone(tz)
-    out: List[Dict[str, Any]] = []
-    for r in records:
-        converted = {}
-        for k, v in r.items():
-            if isinstance(v, (pd.Timestamp, datetime)):
-                if v.tzinfo is None:
-                    v = tzinfo.localize(v)
-                v = v.astimezone(pytz.UTC)
-                converted[k] = v.isoformat()
-            else:
-                converted[k] = v
-        out.append(converted)
-    return out
-
-
-def cast_nulls(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return [{k: (None if v == "" else v) for k, v in r.items()} for r in records]
-
-
-def align_columns(
-    records: List[Dict[str, Any]], columns: List[str]
+@functools.lru_cache(maxsize=32)
+def _zone(tz: str) -> ZoneInfo:
+    return ZoneInfo(tz)
+
+
+def _is_datetime_column(col: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(col.dtype):
+        return True
+    first = col.first_valid_index()
+    return first is not None and isinstance(col[first], (pd.Timestamp, datetime))
+
+
+# Naive datetimes inside pandas' nanosecond range (with a day to spare
+# for the UTC offset) are converted columnwise; anything else goes per cell
+_FRAME_MIN = datetime(1677, 9, 23)
+_FRAME_MAX = datetime(2262, 4, 10)
+_UTC_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+
+
+def _localize(v: datetime, zone: ZoneInfo) -> datetime:
+    # Same choice as pytz's localize(is_dst=False): ambiguous and nonexistent
+    # wall times take the standard-time offset
+    later = v.replace(tzinfo=zone, fold=1)
+    return later if not later.dst() else v.replace(tzinfo=zone, fold=0)
+
+
+def _to_utc(v: Any, zone: ZoneInfo) -> Any:
+    if v is pd.NaT:
+        return None
+    if not isinstance(v, datetime):
+        return v
+    if v.tzinfo is None:
+        v = _localize(v, zone)
+    try:
+        return v.astimezone(timezone.utc)
+    except OverflowError:
+        # 0001-01-01 / 9999-12-31 sentinels pushed past datetime's range by
+        # the offset are pinned to the range's ends
+        edge = datetime.min if v.year == 1 else datetime.max
+        return edge.replace(tzinfo=timezone.utc)
+
+
+def _format_utc(v: Any) -> Any:
+    return v.isoformat(timespec="microseconds") if isinstance(v, datetime) else v
+
+
+def _in_frame_range(v: Any) -> bool:
+    return (
+        isinstance(v, datetime)
+        and v.tzinfo is None
+        and v is not pd.NaT
+        and _FRAME_MIN <= v <= _FRAME_MAX
+    )
+
+
+def _normalize_timestamp_frame(
+    df: pd.DataFrame,
+    tz: str,
+    columns: Optional[Iterable[str]] = None,
+    as_string: bool = True,
+) -> pd.DataFrame:
+    # columns=None probes every column; callers that know the source schema
+    # pass the datetime columns so nothing has to be inspected.
+    # as_string=False keeps datetime64[ns, UTC] columns for Arrow/Parquet
+    # (object columns of UTC datetimes when some value is out of range).
+    if columns is None:
+        columns = [c for c in df.columns if _is_datetime_column(df[c])]
+    zone = _zone(tz)
+    for c in columns:
+        values = df[c].to_numpy(dtype=object)
+        fast = np.fromiter(
+            (_in_frame_range(v) for v in values), dtype=bool, count=len(values)
+        )
+        pos = np.flatnonzero(fast)
+        utc = (
+            pd.to_datetime(pd.Series(values[pos], dtype=object))
+            .dt.as_unit("ns")
+            .dt.tz_localize(
+                zone,
+                # ambiguous wall times resolve to standard time (is_dst=False);
+                # nonexistent ones come back NaT and take the per-cell path
+                ambiguous=np.zeros(len(pos), dtype=bool),
+                nonexistent="NaT",
+            )
+            .dt.tz_convert(timezone.utc)
+        )
+        done = utc.notna().to_numpy()
+        fast[pos[~done]] = False
+        pos, utc = pos[done], utc[done]
+        slow = [(i, _to_utc(values[i], zone)) for i in np.flatnonzero(~fast)]
+        if as_string:
+            out = np.full(len(values), None, dtype=object)
+            out[pos] = utc.dt.strftime(_UTC_FORMAT).to_numpy(dtype=object)
+            for i, v in slow:
+                out[i] = _format_utc(v)
+            df[c] = pd.Series(out, index=df.index, dtype=object)
+        elif any(v is not None for _, v in slow):
+            out = np.full(len(values), None, dtype=object)
+            out[pos] = utc.to_numpy(dtype=object)
+            for i, v in slow:
+                out[i] = v
+            df[c] = pd.Series(out, index=df.index, dtype=object)
+        else:
+            col = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns, UTC]")
+            col.iloc[pos] = utc.to_numpy()
+            df[c] = col
+    return df
+
+
+def transform_frame(
+    rows: Sequence[Sequence[Any]],
+    columns: List[str],
+    tz: str,
+    timestamp_columns: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    # Same steps as transform_batch, but timestamps stay datetime64 so the
+    # frame can be shipped to BigQuery as Parquet without any dicts
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    df = df.where(df != "", None)
+    return _normalize_timestamp_frame(df, tz, timestamp_columns, as_string=False)
+
+
+def transform_batch(
+    rows: Sequence[Sequence[Any]],
+    columns: List[str],
+    tz: str,
+    timestamp_columns: Optional[Iterable[str]] = None,
 ) -> List[Dict[str, Any]]:
-    if not records:
+    # Null empty strings and normalise timestamps over one frame built
+    # straight from the cursor's value tuples (ordered as `columns`); dicts
+    # are only materialised once, for the loader
+    if not rows:
         return []
-    aligned = []
-    for r in records:
-        aligned.append({c: r.get(c) for c in columns})
-    return aligned
+    if timestamp_columns is not None and not timestamp_columns:
+        # No datetime columns in the schema: a plain comprehension beats the
+        # frame round trip (~4x on 50k x 20 rows)
+        cols = tuple(columns)
+        return [
+            {c: (None if v == "" else v) for c, v in zip(cols, row)} for row in rows
+        ]
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    df = df.where(df != "", None)
+    return _normalize_timestamp_frame(df, tz, timestamp_columns).to_dict(
+        orient="records"
+    )
@@ -0,0 +1,230 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import BigQueryWriteClient, types, writer
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+from .logger import get_logger
+from .schema import get_bq_table_schema
+
+logger = get_logger("etl.write")
+
+# AppendRows requests are capped at 10 MB; leave headroom for framing.
+_MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_DATE = date(1970, 1, 1)
+
+_FieldType = descriptor_pb2.FieldDescriptorProto.Type
+
+BQ_TO_PROTO_TYPE = {
+    "INTEGER": _FieldType.TYPE_INT64,
+    "INT64": _FieldType.TYPE_INT64,
+    "FLOAT": _FieldType.TYPE_DOUBLE,
+    "FLOAT64": _FieldType.TYPE_DOUBLE,
+    "BOOLEAN": _FieldType.TYPE_BOOL,
+    "BOOL": _FieldType.TYPE_BOOL,
+    "TIMESTAMP": _FieldType.TYPE_INT64,
+    "DATE": _FieldType.TYPE_INT32,
+    "BYTES": _FieldType.TYPE_BYTES,
+}
+
+
+def _to_timestamp_micros(v: Any) -> int:
+    if isinstance(v, str):
+        v = datetime.fromisoformat(v)
+    if isinstance(v, datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=timezone.utc)
+        return (v - _EPOCH) // timedelta(microseconds=1)
+    return int(v)
+
+
+def _to_epoch_days(v: Any) -> int:
+    if isinstance(v, str):
+        v = date.fromisoformat(v[:10])
+    if isinstance(v, datetime):
+        v = v.date()
+    if isinstance(v, date):
+        return (v - _EPOCH_DATE).days
+    return int(v)
+
+
+def _to_string(v: Any) -> str:
+    if isinstance(v, timedelta):
+        seconds, micros = divmod(v // timedelta(microseconds=1), 1_000_000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{micros:06d}"
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+def _to_bytes(v: Any) -> bytes:
+    return v.encode("utf-8") if isinstance(v, str) else bytes(v)
+
+
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "INTEGER": int,
+    "INT64": int,
+    "FLOAT": float,
+    "FLOAT64": float,
+    "BOOLEAN": bool,
+    "BOOL": bool,
+    "TIMESTAMP": _to_timestamp_micros,
+    "DATE": _to_epoch_days,
+    "BYTES": _to_bytes,
+}
+
+
+@dataclass
+class _RowCodec:
+    descriptor: descriptor_pb2.DescriptorProto
+    message_class: Any
+    fields: List[Tuple[str, Callable[[Any], Any]]]
+
+    def encode(self, row: Dict[str, Any]) -> bytes:
+        values = {}
+        for name, convert in self.fields:
+            v = row.get(name)
+            if v is not None:
+                values[name] = convert(v)
+        return self.message_class(**values).SerializeToString()
+
+
+def _build_codec(table: str, schema: List[bigquery.SchemaField]) -> _RowCodec:
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f"{table}.proto", package="etl_write", syntax="proto2"
+    )
+    msg = file_proto.message_type.add(name="Row")
+    fields: List[Tuple[str, Callable[[Any], Any]]] = []
+    for f in schema:
+        # Nested and repeated fields are never produced from flat MySQL rows.
+        if f.mode == "REPEATED" or f.field_type in ("RECORD", "STRUCT"):
+            continue
+        field_type = f.field_type.upper()
+        msg.field.add(
+            name=f.name,
+            number=len(fields) + 1,
+            type=BQ_TO_PROTO_TYPE.get(field_type, _FieldType.TYPE_STRING),
+            label=descriptor_pb2.FieldDescriptorProto.Label.LABEL_OPTIONAL,
+        )
+        fields.append((f.name, _CONVERTERS.get(field_type, _to_string)))
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    message_class = message_factory.GetMessageClass(
+        pool.FindMessageTypeByName("etl_write.Row")
+    )
+    return _RowCodec(descriptor=msg, message_class=message_class, fields=fields)
+
+
+class BigQueryWriter:
+    def __init__(self, client: bigquery.Client, dataset: str):
+        self.bq_client = client
+        self.client = BigQueryWriteClient()
+        self.dataset = dataset
+        self._codecs: Dict[str, _RowCodec] = {}
+
+    def _table_path(self, table: str) -> str:
+        return self.client.table_path(self.bq_client.project, self.dataset, table)
+
+    def _codec(
+        self, table: str, schema: Optional[List[bigquery.SchemaField]] = None
+    ) -> _RowCodec:
+        codec = self._codecs.get(table)
+        if codec is None:
+            if schema is None:
+                schema = get_bq_table_schema(self.bq_client, self.dataset, table)
+            codec = _build_codec(table, schema)
+            self._codecs[table] = codec
+        return codec
+
+    def _chunks(
+        self, codec: _RowCodec, rows: List[Dict[str, Any]]
+    ) -> Iterator[List[bytes]]:
+        chunk: List[bytes] = []
+        size = 0
+        for r in rows:
+            payload = codec.encode(r)
+            if chunk and size + len(payload) > _MAX_REQUEST_BYTES:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(payload)
+            size += len(payload)
+        if chunk:
+            yield chunk
+
+    def _append(
+        self,
+        stream_name: str,
+        table: str,
+        rows: List[Dict[str, Any]],
+        offsets: bool,
+        schema: Optional[List[bigquery.SchemaField]],
+    ) -> int:
+        codec = self._codec(table, schema)
+        template = types.AppendRowsRequest(
+            write_stream=stream_name,
+            proto_rows=types.AppendRowsRequest.ProtoData(
+                writer_schema=types.ProtoSchema(proto_descriptor=codec.descriptor)
+            ),
+        )
+        stream = writer.AppendRowsStream(self.client, template)
+        try:
+            futures = []
+            offset = 0
+            for chunk in self._chunks(codec, rows):
+                request = types.AppendRowsRequest(
+                    proto_rows=types.AppendRowsRequest.ProtoData(
+                        rows=types.ProtoRows(serialized_rows=chunk)
+                    )
+                )
+                if offsets:
+                    request.offset = offset
+                futures.append(stream.send(request))
+                offset += len(chunk)
+            for future in futures:
+                future.result()
+        finally:
+            stream.close()
+        return len(rows)
+
+    def append_default(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        schema: Optional[List[bigquery.SchemaField]] = None,
+    ) -> int:
+        if not rows:
+            return 0
+        stream_name = f"{self._table_path(table)}/streams/_default"
+        return self._append(stream_name, table, rows, offsets=False, schema=schema)
+
+    def append_pending(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        schema: Optional[List[bigquery.SchemaField]] = None,
+    ) -> int:
+        if not rows:
+            return 0
+        parent = self._table_path(table)
+        stream = self.client.create_write_stream(
+            parent=parent,
+            write_stream=types.WriteStream(type_=types.WriteStream.Type.PENDING),
+        )
+        written = self._append(stream.name, table, rows, offsets=True, schema=schema)
+        self.client.finalize_write_stream(name=stream.name)
+        response = self.client.batch_commit_write_streams(
+            types.BatchCommitWriteStreamsRequest(
+                parent=parent, write_streams=[stream.name]
+            )
+        )
+        if response.stream_errors:
+            raise RuntimeError(
+                f"Failed to commit write stream for {table}: {response.stream_errors}"
+            )
+        return written
@@ -0,0 +1,24 @@
+import os
+
+from etl.config_loader import load_config
+
+
+def test_env_vars_are_rendered_on_every_load(tmp_path, monkeypatch):
+    path = tmp_path / "config.yaml"
+    path.write_text("project: ${TEST_PROJECT_ID}\ndataset: ds\n")
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    monkeypatch.delenv("TEST_PROJECT_ID", raising=False)
+    assert load_config(str(path))["project"] is None
+
+    # As after load_dotenv(): same file and mtime, new environment
+    monkeypatch.setenv("TEST_PROJECT_ID", "my-project")
+    assert os.stat(path).st_mtime_ns == mtime_ns
+    assert load_config(str(path)) == {"project": "my-project", "dataset": "ds"}
+
+
+def test_returned_config_is_a_copy(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("mappings:\n  - name: users\n")
+    load_config(str(path))["mappings"].append({"name": "orders"})
+    assert load_config(str(path)) == {"mappings": [{"name": "users"}]}
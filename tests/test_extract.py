@@ -0,0 +1,101 @@
+import random
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import Error
+
+from etl import extract
+from etl.extract import MySQLExtractor, Session
+
+# 3 rows per incremental value, so batch edges split ties
+ROWS = [(i // 3, f"row-{i}") for i in range(60)]
+
+
+class FakeCursor:
+    def __init__(self, fail_after, seed):
+        self.fail_after = fail_after
+        self.seed = seed
+        self.fetches = 0
+
+    def execute(self, query, params):
+        lower = query.split("WHERE", 1)[1].split("%s", 1)[0]
+        start = params[0]
+        if ">=" in lower:
+            rows = [r for r in ROWS if r[0] >= start]
+        else:
+            rows = [r for r in ROWS if r[0] > start]
+        # Ties come back in a different order on every execution
+        rng = random.Random(self.seed)
+        groups = {}
+        for r in rows:
+            groups.setdefault(r[0], []).append(r)
+        self.rows = [r for k in sorted(groups) for r in rng.sample(groups[k], 3)]
+
+    def fetchmany(self, n):
+        self.fetches += 1
+        if self.fail_after is not None and self.fetches > self.fail_after:
+            raise Error("Lost connection to MySQL server during query")
+        out, self.rows = self.rows[:n], self.rows[n:]
+        return out
+
+
+class FakeExtractor(MySQLExtractor):
+    def __init__(self, failures, close_error=None):
+        super().__init__({})
+        self.failures = list(failures)
+        self.close_error = close_error
+        self.sessions = 0
+
+    @contextmanager
+    def session(self):
+        self.sessions += 1
+        fail_after = self.failures.pop(0) if self.failures else None
+        try:
+            yield Session(conn=None, cursor=FakeCursor(fail_after, self.sessions))
+        finally:
+            if self.close_error is not None:
+                raise self.close_error
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+
+
+def _stream(extractor, batch_size=4):
+    batches = extractor.iter_incremental(
+        "t", ["k", "v"], "k", 0, batch_size=batch_size, operator=">="
+    )
+    return [row for batch in batches for row in batch]
+
+
+def test_resume_after_dropped_connections_keeps_every_row_once():
+    extractor = FakeExtractor(failures=[2, 3, 1, 4])
+    rows = _stream(extractor)
+    assert sorted(rows) == sorted(ROWS)
+    assert extractor.sessions == 5
+
+
+def test_gives_up_after_stream_attempts():
+    extractor = FakeExtractor(failures=[0] * extract.STREAM_ATTEMPTS)
+    with pytest.raises(Error):
+        _stream(extractor)
+    assert extractor.sessions == extract.STREAM_ATTEMPTS
+
+
+def test_too_many_ties_are_not_resumed(monkeypatch):
+    monkeypatch.setattr(extract, "MAX_RESUME_TIES", 2)
+    extractor = FakeExtractor(failures=[1])
+    with pytest.raises(Error):
+        # The first batch is one whole tie group of 3 rows
+        _stream(extractor, batch_size=3)
+    assert extractor.sessions == 1
+
+
+def test_close_error_is_not_retried():
+    extractor = FakeExtractor(failures=[], close_error=Error("close failed"))
+    batches = extractor.iter_incremental("t", ["k", "v"], "k", 0, batch_size=4)
+    next(batches)
+    with pytest.raises(Error):
+        batches.close()
+    assert extractor.sessions == 1
@@ -0,0 +1,128 @@
+import pytest
+from google.cloud import bigquery
+
+from etl import load
+from etl.load import BigQueryLoader
+
+SCHEMA = [
+    bigquery.SchemaField("id", "INT64"),
+    bigquery.SchemaField("name", "STRING"),
+    bigquery.SchemaField("updated_at", "TIMESTAMP"),
+    bigquery.SchemaField("created_on", "DATE"),
+]
+
+
+class FakeClient:
+    def __init__(self, project):
+        self.project = project
+        self.created = []
+
+    def get_dataset(self, ref):
+        return ref
+
+    def get_table(self, ref):
+        return bigquery.Table(ref, schema=SCHEMA)
+
+    def create_table(self, table):
+        self.created.append(table.table_id)
+        return table
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    monkeypatch.setattr(load.bigquery, "Client", FakeClient)
+    return BigQueryLoader("p", "d")
+
+
+def _sql(loader, strategy="merge", columns=None, primary_keys=None, **kwargs):
+    template = loader._upsert_template(
+        "t",
+        "stg",
+        primary_keys or ["id"],
+        columns or ["id", "name", "updated_at"],
+        "updated_at",
+        strategy,
+        kwargs.get("partition_field"),
+        kwargs.get("partition_type"),
+    )
+    assert template.strategy == strategy
+    # Compare on single-spaced SQL so indentation stays free to change
+    return " ".join(template.sql.split())
+
+
+DEDUP_SOURCE = (
+    "( SELECT * EXCEPT(_row_num) FROM ( SELECT *, ROW_NUMBER() OVER "
+    "(PARTITION BY id ORDER BY updated_at DESC) AS _row_num FROM `p.d.stg` ) "
+    "WHERE _row_num = 1 )"
+)
+
+
+def test_merge_updates_non_keys_and_inserts_rows(loader):
+    assert _sql(loader) == (
+        f"MERGE `p.d.t` T USING {DEDUP_SOURCE} S ON T.id = S.id "
+        "WHEN MATCHED THEN UPDATE SET name = S.name, updated_at = S.updated_at "
+        "WHEN NOT MATCHED THEN INSERT ROW"
+    )
+
+
+def test_merge_with_only_keys_just_inserts(loader):
+    sql = _sql(loader, columns=["id", "tag"], primary_keys=["id", "tag"])
+    assert "PARTITION BY id, tag ORDER BY updated_at DESC" in sql
+    assert sql.endswith(
+        "S ON T.id = S.id AND T.tag = S.tag WHEN NOT MATCHED THEN INSERT ROW"
+    )
+    assert "WHEN MATCHED" not in sql
+
+
+@pytest.mark.parametrize(
+    "field, field_type", [("updated_at", "TIMESTAMP"), ("created_on", "DATE")]
+)
+def test_delete_insert_bounds_delete_to_staged_partitions(loader, field, field_type):
+    sql = _sql(
+        loader, "delete_insert", partition_field=field, partition_type=field_type
+    )
+    assert sql == (
+        f"DECLARE lo {field_type}; DECLARE hi {field_type}; "
+        f"SET (lo, hi) = ( SELECT AS STRUCT MIN({field}), MAX({field}) "
+        "FROM `p.d.stg` ); "
+        "BEGIN TRANSACTION; "
+        f"DELETE FROM `p.d.t` T WHERE ( T.{field} BETWEEN lo AND hi "
+        f"OR T.{field} IS NULL ) "
+        "AND EXISTS (SELECT 1 FROM `p.d.stg` S WHERE T.id = S.id); "
+        f"INSERT INTO `p.d.t` SELECT * FROM {DEDUP_SOURCE}; "
+        "COMMIT TRANSACTION;"
+    )
+
+
+@pytest.mark.parametrize(
+    "field, field_type", [("updated_at", "TIMESTAMP"), ("created_on", "DATE")]
+)
+def test_partition_field_type(loader, field, field_type):
+    assert loader._partition_field_type("t", field) == field_type
+
+
+@pytest.mark.parametrize(
+    "partition_field, message",
+    [
+        (None, "needs partition_field"),
+        ("missing", "got None"),
+        ("name", "got STRING"),
+    ],
+)
+def test_delete_insert_rejects_bad_partition_field(loader, partition_field, message):
+    with pytest.raises(ValueError, match=message):
+        loader.load_upsert(
+            "t",
+            [{"id": 1, "name": "a"}],
+            ["id"],
+            strategy="delete_insert",
+            partition_field=partition_field,
+        )
+    # Rejected before any staging table is created
+    assert loader.client.created == []
+    assert loader._staging == {}
+
+
+def test_unknown_strategy(loader):
+    with pytest.raises(ValueError, match="Unknown upsert strategy"):
+        loader.load_upsert("t", [{"id": 1}], ["id"], strategy="replace")
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from etl.transform import transform_batch, transform_frame
+
+
+def _utc_string(value, tz):
+    rows = transform_batch([(value,)], ["ts"], tz=tz, timestamp_columns=["ts"])
+    return rows[0]["ts"]
+
+
+@pytest.mark.parametrize(
+    "value, tz, expected",
+    [
+        # MySQL DATETIME sentinels sit outside pandas' nanosecond range
+        (datetime(1000, 1, 1), "UTC", "1000-01-01T00:00:00.000000+00:00"),
+        (datetime(1000, 1, 1), "America/New_York", "1000-01-01T04:56:02.000000+00:00"),
+        (datetime(1000, 1, 1), "Europe/Berlin", "0999-12-31T23:06:32.000000+00:00"),
+        (
+            datetime(9999, 12, 31, 23, 59, 59),
+            "UTC",
+            "9999-12-31T23:59:59.000000+00:00",
+        ),
+        (
+            datetime(9999, 12, 31, 12, 0, 0),
+            "America/New_York",
+            "9999-12-31T17:00:00.000000+00:00",
+        ),
+        # Shifted past datetime.max by the offset: pinned to the maximum
+        (
+            datetime(9999, 12, 31, 23, 59, 59),
+            "America/New_York",
+            "9999-12-31T23:59:59.999999+00:00",
+        ),
+    ],
+)
+def test_out_of_range_sentinels(value, tz, expected):
+    assert _utc_string(value, tz) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        # Nonexistent (spring forward) and ambiguous (fall back) wall times
+        # take the standard-time offset, as pytz's localize() did
+        (datetime(2024, 3, 10, 2, 30), "2024-03-10T07:30:00.000000+00:00"),
+        (datetime(2024, 11, 3, 1, 30), "2024-11-03T06:30:00.000000+00:00"),
+        (datetime(2024, 6, 1, 12, 0, 0, 5), "2024-06-01T16:00:00.000005+00:00"),
+    ],
+)
+def test_dst_transitions(value, expected):
+    assert _utc_string(value, "America/New_York") == expected
+
+
+def test_nulls_and_non_datetime_values_pass_through():
+    rows = transform_batch(
+        [(None, ""), ("0000-00-00", "x")],
+        ["ts", "name"],
+        tz="UTC",
+        timestamp_columns=["ts"],
+    )
+    assert rows == [{"ts": None, "name": None}, {"ts": "0000-00-00", "name": "x"}]
+
+
+def test_frame_keeps_sentinels():
+    df = transform_frame(
+        [(datetime(2024, 1, 1),), (datetime(9999, 12, 31),), (None,)],
+        ["ts"],
+        tz="UTC",
+        timestamp_columns=["ts"],
+    )
+    assert list(df["ts"]) == [
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+        datetime(9999, 12, 31, tzinfo=timezone.utc),
+        None,
+    ]
+
+
+def test_frame_in_range_stays_datetime64():
+    df = transform_frame(
+        [(datetime(2024, 1, 1),), (None,)], ["ts"], tz="UTC", timestamp_columns=["ts"]
+    )
+    assert str(df["ts"].dtype) == "datetime64[ns, UTC]"